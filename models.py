@@ -1,5 +1,5 @@
 # models.py
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, Date, ForeignKey
+from sqlalchemy import event, create_engine, Column, Integer, String, Float, Boolean, Date, ForeignKey, Index, Text
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
 
 Base = declarative_base()
@@ -28,7 +28,7 @@ class Task(Base):
     __tablename__ = 'tasks'
     id = Column(Integer, primary_key=True)
     title = Column(String(200), nullable=False)
-    description = Column(String(500), nullable=True)
+    description = Column(Text, nullable=True)
     is_global = Column(Boolean, default=False)
     assigned_to = Column(Integer, ForeignKey('users.id'), nullable=True)
     assigned_group_id = Column(Integer, ForeignKey('groups.id'), nullable=True)
@@ -41,6 +41,9 @@ class Task(Base):
 
 class TaskInstance(Base):
     __tablename__ = 'task_instances'
+    __table_args__ = (
+        Index('ix_taskinstance_date_task', 'date', 'task_id'),
+    )
     id = Column(Integer, primary_key=True)
     task_id = Column(Integer, ForeignKey('tasks.id'), nullable=False)
     date = Column(Date, nullable=False)
@@ -53,10 +56,34 @@ class TaskInstance(Base):
 
 
 def get_engine(db_url: str):
-    return create_engine(db_url, connect_args={"check_same_thread": False} if "sqlite" in db_url else {})
+    if "sqlite" in db_url:
+        # SQLite serialises writers anyway; keep the dialect's default pool
+        pool_args = {"connect_args": {"check_same_thread": False}}
+    else:
+        pool_args = {"pool_size": 10, "max_overflow": 20, "pool_recycle": 1800}
+    engine = create_engine(db_url, pool_pre_ping=True, **pool_args)
+    if "sqlite" in db_url:
+        # WAL: readers don't block the writer; synchronous=NORMAL: fewer fsyncs per commit
+        @event.listens_for(engine, "connect")
+        def _sqlite_pragmas(dbapi_conn, _):
+            cur = dbapi_conn.cursor()
+            cur.execute("PRAGMA journal_mode=WAL")
+            cur.execute("PRAGMA synchronous=NORMAL")
+            cur.execute("PRAGMA temp_store=MEMORY")
+            cur.execute("PRAGMA mmap_size=268435456")
+            cur.close()
+    return engine
 
 
-def get_session(engine):
-    Session = sessionmaker(bind=engine)
+def get_sessionmaker(engine):
     Base.metadata.create_all(engine)
-    return Session()
+    # create_all skips existing tables, so add any indexes missing from older databases
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    # expire_on_commit=False: avoid re-SELECTing every attribute after each commit
+    return sessionmaker(bind=engine, expire_on_commit=False)
+
+
+def get_session(engine):
+    return get_sessionmaker(engine)()
@@ -1,357 +1,551 @@
 # streamlit_app.py
 import streamlit as st
 import os
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
 from dotenv import load_dotenv
-from models import get_engine, get_session, User, Group, Task, TaskInstance
-from werkzeug.security import generate_password_hash, check_password_hash
+from models import get_engine, get_sessionmaker, User, Group, Task, TaskInstance
+from sqlalchemy import case, exists, func, insert, literal, or_, select, update
+from sqlalchemy.orm import load_only
+from werkzeug.security import check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
 from datetime import date
 import pandas as pd
 import plotly.express as px
 
 load_dotenv()
 DB_URL = os.getenv('DATABASE_URL', 'sqlite:///task_tracker.db')
+ROLE_LABELS = {'user': 'مستخدم', 'admin': 'مدير'}
 
-# ✅ إصلاح: استخدام cache_resource لتجنب إعادة إنشاء الجلسة في كل تحديث
+# ✅ إصلاح: استخدام cache_resource لمشاركة المحرك (ومجمع الاتصالات) وsessionmaker بين التحديثات
 @st.cache_resource
-def init_db():
-    engine = get_engine(DB_URL)
-    return get_session(engine)
+def init_db(db_url: str):
+    engine = get_engine(db_url)
+    return engine, get_sessionmaker(engine)
 
-session = init_db()
+engine, SessionLocal = init_db(DB_URL)
+
+# ✅ تحسين: جلسة قصيرة العمر لكل تحديث بدلاً من جلسة عامة مشتركة بين جميع المستخدمين
+# (تُغلق في نهاية التحديث داخل finally أدناه، بما في ذلك عند st.rerun())
+session = SessionLocal()
 
 st.set_page_config(page_title="متتبع المهام", layout="wide", initial_sidebar_state="expanded")
 
 # --- مساعدات ---
+# ✅ تحسين: نتيجة البحث مخزنة مؤقتاً كقاموس (كائنات ORM لا تصلح للتخزين بين التحديثات)
+@st.cache_data(ttl=60)
 def get_user_by_email(email: str):
-    return session.query(User).filter_by(email=email).first()
-
-def create_admin_if_none():
-    admin = session.query(User).filter_by(role='admin').first()
-    if not admin:
-        if not get_user_by_email('admin@example.com'):
-            u = User(
-                name='Admin',
-                email='admin@example.com',
-                password_hash=generate_password_hash('admin123'),
-                role='admin'
-            )
-            session.add(u)
-            session.commit()
-            st.info("تم إنشاء المدير: admin@example.com / admin123")
+    row = (
+        session.query(User.id, User.name, User.password_hash, User.role, User.group_id)
+        .filter_by(email=email)
+        .first()
+    )
+    return row._asdict() if row else None
+
+# ✅ تحسين: Argon2 (تنفيذ C) بدلاً من PBKDF2 في Werkzeug؛ التجزئات القديمة تُتحقق عبر Werkzeug
+password_hasher = PasswordHasher()
+
+def hash_password(password: str) -> str:
+    return password_hasher.hash(password)
+
+def verify_password(password_hash: str, password: str) -> bool:
+    if not password_hash.startswith('$argon2'):
+        return check_password_hash(password_hash, password)
+    try:
+        return password_hasher.verify(password_hash, password)
+    except (VerificationError, InvalidHashError):
+        return False
+
+def needs_rehash(password_hash: str) -> bool:
+    return not password_hash.startswith('$argon2') or password_hasher.check_needs_rehash(password_hash)
+
+# ✅ تحسين: التجزئة في خيط خلفي لتتداخل مع استعلامات قاعدة البيانات أثناء إنشاء المستخدم
+@st.cache_resource
+def hasher_pool():
+    return ThreadPoolExecutor(max_workers=2)
+
+# ✅ تحسين: عبارة INSERT ... SELECT واحدة تُنفذ مرة واحدة لكل عملية بدلاً من استعلامين في كل تحديث
+# تُرجع قاموساً مشتركاً على مستوى العملية؛ مفتاح 'created' يُسحب (pop) عند أول عرض للتنبيه فقط
+# (لا تُستدعى عناصر واجهة هنا لأن cache_resource يعيد عرضها في كل تحديث)
+@st.cache_resource
+def create_admin_if_none() -> dict:
+    admin_row = select(
+        literal('Admin'),
+        literal('admin@example.com'),
+        literal(hash_password('admin123')),
+        literal('admin')
+    ).where(
+        ~exists().where(User.role == 'admin'),
+        ~exists().where(User.email == 'admin@example.com')
+    )
+    result = session.execute(
+        insert(User).from_select(['name', 'email', 'password_hash', 'role'], admin_row)
+    )
+    session.commit()
+    return {'created': bool(result.rowcount)}
 
 def login(email: str, password: str):
     u = get_user_by_email(email)
-    if u and check_password_hash(u.password_hash, password):
-        return u
+    if u and verify_password(u['password_hash'], password):
+        # ترحيل شفاف: إعادة تجزئة السجلات القديمة (PBKDF2) بـ Argon2 عند أول دخول ناجح
+        if needs_rehash(u['password_hash']):
+            session.query(User).filter_by(id=u['id']).update({User.password_hash: hash_password(password)})
+            session.commit()
+            get_user_by_email.clear()
+        return SimpleNamespace(**u)
     return None
 
-def compute_points(completed_value: float, points_per_unit: float) -> float:
-    return completed_value * (points_per_unit or 1.0)
+def user_snapshot(u) -> dict:
+    # نسخة خفيفة من بيانات المستخدم تُحفظ في session_state لتجنب استعلامه في كل تحديث
+    return {'id': u.id, 'name': u.name, 'role': u.role, 'group_id': u.group_id}
 
 def get_user(user_id: int):
     # ✅ إصلاح: session.get() بدلاً من session.query().get() المهملة في SQLAlchemy 2.0
-    return session.get(User, user_id)
-
-def get_task(task_id: int):
-    return session.get(Task, task_id)
-
-def get_group(group_id: int):
-    return session.get(Group, group_id)
-
-# --- تهيئة ---
-create_admin_if_none()
-
-if 'page' not in st.session_state:
-    st.session_state['page'] = 'login'
-
-# ===================== صفحة تسجيل الدخول =====================
-if st.session_state['page'] == 'login':
-    col1, col2, col3 = st.columns([1, 2, 1])
-    with col2:
-        st.title("🔐 تسجيل الدخول")
-        with st.form("login_form"):
-            email = st.text_input("البريد الإلكتروني", placeholder="admin@example.com")
-            password = st.text_input("كلمة المرور", type="password")
-            submitted = st.form_submit_button("دخول", use_container_width=True)
-
-        if submitted:
-            user = login(email.strip(), password)
-            if user:
-                st.session_state['user_id'] = user.id
-                st.session_state['user_name'] = user.name
-                st.session_state['user_role'] = user.role
-                st.session_state['page'] = 'dashboard'
-                # ✅ إصلاح: st.rerun() بدلاً من st.experimental_rerun() المحذوفة
-                st.rerun()
-            else:
-                st.error("❌ بيانات غير صحيحة")
-
-# ===================== الصفحات المحمية =====================
-if 'user_id' in st.session_state and st.session_state.get('page') != 'login':
-    user = get_user(st.session_state['user_id'])
-
-    # حالة استثنائية: المستخدم غير موجود في قاعدة البيانات
-    if not user:
-        st.error("خطأ: المستخدم غير موجود. يرجى تسجيل الدخول مجدداً.")
-        st.session_state.clear()
-        st.rerun()
-
-    # --- الشريط الجانبي ---
-    with st.sidebar:
-        st.markdown(f"### 👤 {user.name}")
-        st.caption(f"الدور: {'مدير' if user.role == 'admin' else 'مستخدم'}")
-        st.divider()
-
-        # ✅ إصلاح: بناء قائمة التنقل بدون None
-        menu_options = ["📊 Dashboard", "✅ مهام اليوم", "📋 المهام"]
-        if user.role == 'admin':
-            menu_options.append("👥 المستخدمون")
-
-        menu = st.radio("القائمة", menu_options)
-        st.divider()
-
-        if st.button("🚪 تسجيل خروج", use_container_width=True):
-            st.session_state.clear()
-            st.rerun()
-
-    # ===================== Dashboard =====================
-    if menu == "📊 Dashboard":
-        st.header("📊 لوحة التقدم")
-        today = date.today()
-        st.caption(f"اليوم: {today.strftime('%Y-%m-%d')}")
-
-        instances = session.query(TaskInstance).filter_by(date=today).all()
-        rows = []
-        for inst in instances:
-            u = get_user(inst.completed_by) if inst.completed_by else None
-            task = get_task(inst.task_id)
-            rows.append({
-                "المستخدم": u.name if u else "غير مكتمل",
-                "المهمة": task.title if task else f"#{inst.task_id}",
-                "النقاط": inst.points_awarded or 0,
-                "الحالة": "✅ مكتملة" if inst.status == 'done' else "⏳ معلقة"
-            })
-
-        if not rows:
-            st.info("لا توجد بيانات لليوم")
-        else:
-            df = pd.DataFrame(rows)
-            agg = df.groupby('المستخدم', as_index=False)['النقاط'].sum()
-            fig = px.bar(
-                agg, x='المستخدم', y='النقاط',
-                title='نقاط كل مستخدم اليوم',
-                color='النقاط', color_continuous_scale='Blues'
-            )
-            st.plotly_chart(fig, use_container_width=True)
-
-            st.subheader("تفاصيل المهام")
-            st.dataframe(df, use_container_width=True)
-
-            total = df['النقاط'].sum()
-            st.metric("إجمالي النقاط اليوم", f"{total:.1f}")
-
-    # ===================== مهام اليوم =====================
-    elif menu == "✅ مهام اليوم":
-        st.header("✅ مهام اليوم")
-        today = date.today()
-        st.caption(f"اليوم: {today.strftime('%Y-%m-%d')}")
-
-        # فلترة المهام حسب صلاحية المستخدم
-        if user.role == 'admin':
-            instances = session.query(TaskInstance).filter_by(date=today).all()
-        else:
-            # عرض المهام الخاصة بالمستخدم أو مجموعته أو العامة
-            all_instances = session.query(TaskInstance).filter_by(date=today).all()
-            instances = []
-            for inst in all_instances:
-                task = get_task(inst.task_id)
-                if task and (
-                    task.is_global or
-                    task.assigned_to == user.id or
-                    (task.assigned_group_id and task.assigned_group_id == user.group_id)
-                ):
-                    instances.append(inst)
-
-        if not instances:
-            st.info("لا توجد مهام لليوم. يمكن إنشاؤها من صفحة المهام.")
-        else:
-            for inst in instances:
-                task = get_task(inst.task_id)
-                task_title = task.title if task else f"مهمة #{inst.task_id}"
-
-                with st.expander(f"{'✅' if inst.status == 'done' else '⏳'} {task_title}", expanded=(inst.status != 'done')):
-                    if task and task.description:
-                        st.write(task.description)
-
-                    col1, col2, col3 = st.columns([2, 2, 1])
-                    with col1:
-                        st.write(f"**الهدف:** {inst.target_value} {task.unit_name if task else ''}")
-                        if inst.completed_by:
-                            completer = get_user(inst.completed_by)
-                            st.write(f"**أُنجز بواسطة:** {completer.name if completer else 'غير معروف'}")
-                    with col2:
-                        val = st.number_input(
-                            "قيمة الإنجاز",
-                            value=float(inst.completed_value or 0.0),
-                            min_value=0.0,
-                            key=f"val_{inst.id}",
-                            disabled=(inst.status == 'done' and user.role != 'admin')
-                        )
-                    with col3:
-                        st.write("")  # مسافة للمحاذاة
-                        if st.button("💾 تسجيل", key=f"btn_{inst.id}", use_container_width=True):
-                            points = compute_points(val, task.points_per_unit if task else 1.0)
-                            inst.completed_value = val
-                            inst.completed_by = user.id
-                            inst.status = 'done'
-                            inst.points_awarded = points
-                            session.commit()
-                            st.success(f"✅ تم تسجيل {points:.1f} نقطة")
-                            st.rerun()
-
-    # ===================== المهام =====================
-    elif menu == "📋 المهام":
-        st.header("📋 إدارة المهام")
-
-        # ✅ التحقق من الصلاحية
-        if user.role != 'admin':
-            st.warning("⚠️ يمكن للمديرين فقط إنشاء المهام. يمكنك مشاهدة القائمة أدناه.")
-        else:
-            st.subheader("إنشاء مهمة جديدة")
-            with st.form("create_task"):
-                title = st.text_input("عنوان المهمة")
-                desc = st.text_area("وصف")
-                col1, col2 = st.columns(2)
-                with col1:
-                    is_global = st.checkbox("مهمة للجميع")
-                    points_per_unit = st.number_input("نقاط لكل وحدة", value=1.0, min_value=0.1)
-                    unit_name = st.text_input("اسم الوحدة (مثلاً: صفحة)")
-                with col2:
-                    users_list = session.query(User).all()
-                    groups_list = session.query(Group).all()
-                    assigned_to = st.selectbox(
-                        "تعيين لمستخدم (اختياري)",
-                        options=[None] + [u.id for u in users_list],
-                        format_func=lambda x: "—" if x is None else get_user(x).name
-                    )
-                    assigned_group = st.selectbox(
-                        "تعيين لمجموعة (اختياري)",
-                        options=[None] + [g.id for g in groups_list],
-                        format_func=lambda x: "—" if x is None else get_group(x).name
-                    )
-                submitted = st.form_submit_button("✅ إنشاء المهمة", use_container_width=True)
+    # تحميل الأعمدة المستخدمة في user_snapshot فقط (بدون password_hash)
+    return session.get(
+        User, user_id,
+        options=[load_only(User.id, User.name, User.role, User.group_id)]
+    )
+
+# ✅ تحسين: إدراج عدة صفوف بعبارة INSERT واحدة (executemany) وتأكيد واحد بدلاً من add/commit لكل صف
+def bulk_insert(model, rows: list) -> None:
+    if not rows:
+        return
+    session.execute(insert(model), rows)
+    session.commit()
+
+# ✅ تحسين: نسخ اليوم مخزنة مؤقتاً لفترة قصيرة (مفتاحها التاريخ)، وتُمسح بعد كل تسجيل أو إنشاء
+# استعلام واحد مع JOIN يجلب بيانات المهمة واسم المُنجز بدون استعلامات إضافية لكل صف
+# عند تمرير user_id تُرجع فقط المهام المرئية للمستخدم (الخاصة به أو بمجموعته أو العامة)
+@st.cache_data(ttl=30)
+def todays_instances(today_iso: str, user_id: int = None, group_id: int = None) -> list:
+    stmt = (
+        select(
+            TaskInstance.id, TaskInstance.task_id, TaskInstance.completed_by,
+            TaskInstance.points_awarded, TaskInstance.status,
+            TaskInstance.target_value, TaskInstance.completed_value,
+            Task.title, Task.description, Task.unit_name,
+            # المعامل الفعلي (1.0 عند غيابه) يُحسب في SQL فيصبح احتساب النقاط ضرباً مباشراً
+            func.coalesce(Task.points_per_unit, 1.0).label('points_per_unit'),
+            User.name.label('completed_by_name')
+        )
+        .join(Task, Task.id == TaskInstance.task_id)
+        .outerjoin(User, User.id == TaskInstance.completed_by)
+        .where(TaskInstance.date == date.fromisoformat(today_iso))
+    )
+    if user_id is not None:
+        visibility = [Task.is_global.is_(True), Task.assigned_to == user_id]
+        if group_id:
+            visibility.append(Task.assigned_group_id == group_id)
+        stmt = stmt.where(or_(*visibility))
+    return [row._asdict() for row in session.execute(stmt)]
+
+# ✅ تحسين: الرسم البياني يُعاد بناؤه فقط عند تغير بيانات التجميع
+@st.cache_data(max_entries=32)
+def build_points_chart(agg_data: tuple):
+    agg = pd.DataFrame(list(agg_data), columns=['المستخدم', 'النقاط'])
+    return px.bar(
+        agg, x='المستخدم', y='النقاط',
+        title='نقاط كل مستخدم اليوم',
+        color='النقاط', color_continuous_scale='Blues'
+    )
+
+# ✅ تحسين: قوائم القراءة فقط (للقوائم المنسدلة والجداول) مخزنة مؤقتاً، وتُمسح بعد كل إضافة
+# تُجلب الأعمدة المطلوبة فقط بدون إنشاء كائنات ORM كاملة
+@st.cache_data(ttl=60)
+def list_users() -> list:
+    rows = (
+        session.query(User.id, User.name, User.email, User.role, Group.name.label('group_name'))
+        .outerjoin(Group, Group.id == User.group_id)
+        .all()
+    )
+    return [r._asdict() for r in rows]
+
+@st.cache_data(ttl=60)
+def list_groups() -> list:
+    return [r._asdict() for r in session.query(Group.id, Group.name).all()]
+
+@st.cache_data(ttl=60)
+def list_tasks() -> list:
+    rows = session.query(
+        Task.id, Task.title, Task.unit_name, Task.points_per_unit,
+        Task.is_global, Task.assigned_to, Task.assigned_group_id
+    ).all()
+    return [r._asdict() for r in rows]
+
+try:
+    # --- تهيئة ---
+    if create_admin_if_none().pop('created', False):
+        st.info("تم إنشاء المدير: admin@example.com / admin123")
+
+    if 'page' not in st.session_state:
+        st.session_state['page'] = 'login'
+
+    # ===================== صفحة تسجيل الدخول =====================
+    if st.session_state['page'] == 'login':
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col2:
+            st.title("🔐 تسجيل الدخول")
+            with st.form("login_form"):
+                email = st.text_input("البريد الإلكتروني", placeholder="admin@example.com")
+                password = st.text_input("كلمة المرور", type="password")
+                submitted = st.form_submit_button("دخول", use_container_width=True)
 
             if submitted:
-                if not title.strip():
-                    st.error("يرجى إدخال عنوان المهمة")
-                else:
-                    t = Task(
-                        title=title.strip(), description=desc,
-                        is_global=is_global, assigned_to=assigned_to,
-                        assigned_group_id=assigned_group,
-                        points_per_unit=points_per_unit,
-                        unit_name=unit_name, created_by=user.id
-                    )
-                    session.add(t)
-                    session.commit()
-                    st.success("✅ تم إنشاء المهمة")
+                user = login(email.strip(), password)
+                if user:
+                    st.session_state['user_id'] = user.id
+                    st.session_state['user'] = user_snapshot(user)
+                    st.session_state['page'] = 'dashboard'
+                    # ✅ إصلاح: st.rerun() بدلاً من st.experimental_rerun() المحذوفة
                     st.rerun()
+                else:
+                    st.error("❌ بيانات غير صحيحة")
+
+    # ===================== الصفحات المحمية =====================
+    if 'user_id' in st.session_state and st.session_state.get('page') != 'login':
+        # ✅ تحسين: قراءة المستخدم من session_state، والرجوع لقاعدة البيانات فقط عند غيابه
+        if 'user' not in st.session_state:
+            db_user = get_user(st.session_state['user_id'])
+
+            # حالة استثنائية: المستخدم غير موجود في قاعدة البيانات
+            if not db_user:
+                st.error("خطأ: المستخدم غير موجود. يرجى تسجيل الدخول مجدداً.")
+                st.session_state.clear()
+                st.rerun()
 
+            st.session_state['user'] = user_snapshot(db_user)
+
+        user = SimpleNamespace(**st.session_state['user'])
+
+        # --- الشريط الجانبي ---
+        with st.sidebar:
+            st.markdown(f"### 👤 {user.name}")
+            st.caption(f"الدور: {ROLE_LABELS.get(user.role, 'مستخدم')}")
             st.divider()
-            st.subheader("إنشاء نسخة يومية (TaskInstance)")
-            task_options = session.query(Task).all()
-            if task_options:
-                sel = st.selectbox(
-                    "اختر مهمة",
-                    options=[None] + [t.id for t in task_options],
-                    format_func=lambda x: "—" if x is None else get_task(x).title
-                )
-                target = st.number_input("القيمة المستهدفة", value=0.0, min_value=0.0)
-                if sel and st.button("➕ إنشاء نسخة لليوم"):
-                    today = date.today()
-                    exists = session.query(TaskInstance).filter_by(task_id=sel, date=today).first()
-                    if exists:
-                        st.warning("⚠️ موجود بالفعل لليوم")
-                    else:
-                        ti = TaskInstance(task_id=sel, date=today, target_value=target)
-                        session.add(ti)
-                        session.commit()
-                        st.success("✅ تم الإنشاء")
-                        st.rerun()
 
-        st.subheader("قائمة المهام")
-        tasks = session.query(Task).all()
-        if not tasks:
-            st.info("لا توجد مهام بعد")
-        else:
-            for t in tasks:
-                assigned_name = get_user(t.assigned_to).name if t.assigned_to else "—"
-                group_name = get_group(t.assigned_group_id).name if t.assigned_group_id else "—"
-                st.write(
-                    f"- **{t.title}** | الوحدة: `{t.unit_name or '—'}` "
-                    f"| نقاط/وحدة: `{t.points_per_unit}` "
-                    f"| للجميع: `{'✅' if t.is_global else '❌'}` "
-                    f"| مستخدم: `{assigned_name}` | مجموعة: `{group_name}`"
+            # ✅ إصلاح: بناء قائمة التنقل بدون None
+            menu_options = ["📊 Dashboard", "✅ مهام اليوم", "📋 المهام"]
+            if user.role == 'admin':
+                menu_options.append("👥 المستخدمون")
+
+            menu = st.radio("القائمة", menu_options)
+            st.divider()
+
+            if st.button("🚪 تسجيل خروج", use_container_width=True):
+                st.session_state.clear()
+                st.rerun()
+
+        # ===================== Dashboard =====================
+        if menu == "📊 Dashboard":
+            st.header("📊 لوحة التقدم")
+            today = date.today()
+            st.caption(f"اليوم: {today.strftime('%Y-%m-%d')}")
+
+            # ✅ تحسين: التجميع حسب المستخدم يتم في SQL (GROUP BY) بدلاً من pandas
+            agg_rows = (
+                session.query(
+                    func.coalesce(User.name, "غير مكتمل"),
+                    func.coalesce(func.sum(TaskInstance.points_awarded), 0)
                 )
+                .select_from(TaskInstance)
+                .outerjoin(User, User.id == TaskInstance.completed_by)
+                .filter(TaskInstance.date == today)
+                .group_by(User.id, User.name)
+                .all()
+            )
 
-    # ===================== المستخدمون (مدير فقط) =====================
-    elif menu == "👥 المستخدمون" and user.role == 'admin':
-        st.header("👥 إدارة المستخدمين والمجموعات")
+            if not agg_rows:
+                st.info("لا توجد بيانات لليوم")
+            else:
+                agg_data = tuple((name, float(points)) for name, points in agg_rows)
+                st.plotly_chart(build_points_chart(agg_data), use_container_width=True)
+
+                st.subheader("تفاصيل المهام")
+                # جلب صفوف التفاصيل فقط عند طلب عرضها
+                if st.toggle("عرض التفاصيل"):
+                    # ✅ تحسين: بناء جدول التفاصيل مباشرة من نتيجة SQL عبر read_sql بدلاً من قائمة قواميس
+                    details_stmt = (
+                        select(
+                            func.coalesce(User.name, "غير مكتمل").label("المستخدم"),
+                            Task.title.label("المهمة"),
+                            func.coalesce(TaskInstance.points_awarded, 0).label("النقاط"),
+                            case((TaskInstance.status == 'done', "✅ مكتملة"), else_="⏳ معلقة").label("الحالة")
+                        )
+                        .select_from(TaskInstance)
+                        .outerjoin(User, User.id == TaskInstance.completed_by)
+                        .outerjoin(Task, Task.id == TaskInstance.task_id)
+                        .where(TaskInstance.date == today)
+                    )
+                    details = pd.read_sql(details_stmt, session.connection())
+                    st.dataframe(details, use_container_width=True)
 
-        col1, col2 = st.columns(2)
+                total = sum(points for _, points in agg_data)
+                st.metric("إجمالي النقاط اليوم", f"{total:.1f}")
 
-        with col1:
-            st.subheader("إنشاء مجموعة")
-            with st.form("create_group"):
-                gname = st.text_input("اسم المجموعة")
-                if st.form_submit_button("✅ إنشاء مجموعة", use_container_width=True):
-                    if not gname.strip():
-                        st.error("يرجى إدخال اسم المجموعة")
+        # ===================== مهام اليوم =====================
+        elif menu == "✅ مهام اليوم":
+            st.header("✅ مهام اليوم")
+            today = date.today()
+            st.caption(f"اليوم: {today.strftime('%Y-%m-%d')}")
+
+            # فلترة المهام حسب صلاحية المستخدم (تتم في SQL)
+            if user.role == 'admin':
+                rows = todays_instances(today.isoformat())
+            else:
+                rows = todays_instances(today.isoformat(), user.id, user.group_id)
+            instances = [SimpleNamespace(**r) for r in rows]
+
+            if not instances:
+                st.info("لا توجد مهام لليوم. يمكن إنشاؤها من صفحة المهام.")
+            else:
+                instances_by_id = {i.id: i for i in instances}
+
+                # ✅ تحسين: جدول واحد قابل للتعديل بدلاً من عناصر منفصلة لكل مهمة، وحفظ جميع التعديلات دفعة واحدة
+                rows = []
+                for inst in instances:
+                    rows.append({
+                        "id": inst.id,
+                        "الحالة": "✅" if inst.status == 'done' else "⏳",
+                        "المهمة": inst.title,
+                        "الوصف": inst.description or "",
+                        "الهدف": f"{inst.target_value} {inst.unit_name or ''}".strip(),
+                        "أُنجز بواسطة": (inst.completed_by_name or 'غير معروف') if inst.completed_by else "—",
+                        "قيمة الإنجاز": float(inst.completed_value or 0.0)
+                    })
+                df = pd.DataFrame(rows).set_index("id")
+
+                edited = st.data_editor(
+                    df,
+                    key="daily_editor",
+                    hide_index=True,
+                    use_container_width=True,
+                    disabled=[c for c in df.columns if c != "قيمة الإنجاز"],
+                    column_config={"قيمة الإنجاز": st.column_config.NumberColumn(min_value=0.0, required=True)}
+                )
+                if user.role != 'admin':
+                    st.caption("لا يمكن تعديل المهام المكتملة إلا من قبل المدير.")
+
+                if st.button("💾 حفظ الكل", use_container_width=True):
+                    changed = edited.index[edited["قيمة الإنجاز"] != df["قيمة الإنجاز"]]
+                    updates = []
+                    skipped = []
+                    for inst_id in changed:
+                        inst = instances_by_id[inst_id]
+                        val = edited.at[inst_id, "قيمة الإنجاز"]
+                        if pd.isna(val):
+                            continue
+                        if inst.status == 'done' and user.role != 'admin':
+                            skipped.append(inst.title)
+                            continue
+                        val = float(val)
+                        updates.append({
+                            "id": int(inst_id),
+                            "completed_value": val,
+                            "completed_by": user.id,
+                            "status": 'done',
+                            "points_awarded": val * inst.points_per_unit
+                        })
+
+                    if skipped:
+                        st.warning(f"⚠️ لم تُحفظ تعديلات المهام المكتملة (للمدير فقط): {'، '.join(skipped)}")
+
+                    if not updates:
+                        if not skipped:
+                            st.info("لا توجد تغييرات للحفظ")
                     else:
-                        grp = Group(name=gname.strip())
-                        session.add(grp)
+                        # UPDATE واحد بالمفتاح الأساسي لجميع الصفوف (executemany)
+                        session.execute(update(TaskInstance), updates)
                         session.commit()
-                        st.success("✅ تم إنشاء المجموعة")
-                        st.rerun()
+                        todays_instances.clear()
+                        points = sum(u['points_awarded'] for u in updates)
+                        st.success(f"✅ تم تسجيل {points:.1f} نقطة")
+                        # إبقاء التحذير ظاهراً بدلاً من إعادة التحميل عند وجود صفوف مُتجاهلة
+                        if not skipped:
+                            st.rerun()
 
-        with col2:
-            st.subheader("إنشاء مستخدم")
-            with st.form("create_user"):
-                uname = st.text_input("الاسم")
-                uemail = st.text_input("البريد")
-                upass = st.text_input("كلمة المرور", type="password")
-                urole = st.selectbox("الدور", options=["user", "admin"], format_func=lambda x: "مدير" if x == "admin" else "مستخدم")
-                groups_list = session.query(Group).all()
-                gid = st.selectbox(
-                    "اختر مجموعة (اختياري)",
-                    options=[None] + [g.id for g in groups_list],
-                    format_func=lambda x: "—" if x is None else get_group(x).name
-                )
-                if st.form_submit_button("✅ إنشاء مستخدم", use_container_width=True):
-                    if not uname.strip() or not uemail.strip() or not upass:
-                        st.error("يرجى ملء جميع الحقول المطلوبة")
-                    elif get_user_by_email(uemail.strip()):
-                        st.error("❌ البريد موجود مسبقاً")
+        # ===================== المهام =====================
+        elif menu == "📋 المهام":
+            st.header("📋 إدارة المهام")
+
+            # ✅ التحقق من الصلاحية
+            if user.role != 'admin':
+                st.warning("⚠️ يمكن للمديرين فقط إنشاء المهام. يمكنك مشاهدة القائمة أدناه.")
+            else:
+                st.subheader("إنشاء مهمة جديدة")
+                with st.form("create_task"):
+                    title = st.text_input("عنوان المهمة")
+                    desc = st.text_area("وصف")
+                    col1, col2 = st.columns(2)
+                    with col1:
+                        is_global = st.checkbox("مهمة للجميع")
+                        points_per_unit = st.number_input("نقاط لكل وحدة", value=1.0, min_value=0.1)
+                        unit_name = st.text_input("اسم الوحدة (مثلاً: صفحة)")
+                    with col2:
+                        users_list = list_users()
+                        groups_list = list_groups()
+                        # ✅ تحسين: قاموس أسماء يُبنى مرة واحدة بدلاً من استعلام لكل خيار
+                        user_names = {u['id']: u['name'] for u in users_list}
+                        user_names[None] = "—"
+                        group_names = {g['id']: g['name'] for g in groups_list}
+                        group_names[None] = "—"
+                        assigned_to = st.selectbox(
+                            "تعيين لمستخدم (اختياري)",
+                            options=[None] + [u['id'] for u in users_list],
+                            format_func=user_names.get
+                        )
+                        assigned_group = st.selectbox(
+                            "تعيين لمجموعة (اختياري)",
+                            options=[None] + [g['id'] for g in groups_list],
+                            format_func=group_names.get
+                        )
+                    submitted = st.form_submit_button("✅ إنشاء المهمة", use_container_width=True)
+
+                if submitted:
+                    if not title.strip():
+                        st.error("يرجى إدخال عنوان المهمة")
                     else:
-                        new_user = User(
-                            name=uname.strip(),
-                            email=uemail.strip(),
-                            password_hash=generate_password_hash(upass),
-                            role=urole,
-                            group_id=gid
+                        t = Task(
+                            title=title.strip(), description=desc,
+                            is_global=is_global, assigned_to=assigned_to,
+                            assigned_group_id=assigned_group,
+                            points_per_unit=points_per_unit,
+                            unit_name=unit_name, created_by=user.id
                         )
-                        session.add(new_user)
+                        session.add(t)
                         session.commit()
-                        st.success("✅ تم إنشاء المستخدم")
+                        list_tasks.clear()
+                        st.success("✅ تم إنشاء المهمة")
                         st.rerun()
 
-        st.divider()
-        st.subheader("قائمة المستخدمين")
-        users_list = session.query(User).all()
-        users_data = [{
-            "الاسم": u.name,
-            "البريد": u.email,
-            "الدور": "مدير" if u.role == "admin" else "مستخدم",
-            "المجموعة": u.group.name if u.group else "—"
-        } for u in users_list]
-        st.dataframe(pd.DataFrame(users_data), use_container_width=True)
+                st.divider()
+                st.subheader("إنشاء نسخة يومية (TaskInstance)")
+                task_options = list_tasks()
+                if task_options:
+                    task_titles = {t['id']: t['title'] for t in task_options}
+                    task_titles[None] = "—"
+                    sel = st.selectbox(
+                        "اختر مهمة",
+                        options=[None] + [t['id'] for t in task_options],
+                        format_func=task_titles.get
+                    )
+                    target = st.number_input("القيمة المستهدفة", value=0.0, min_value=0.0)
+                    if sel and st.button("➕ إنشاء نسخة لليوم"):
+                        today = date.today()
+                        already_exists = session.query(
+                            exists().where(TaskInstance.task_id == sel, TaskInstance.date == today)
+                        ).scalar()
+                        if already_exists:
+                            st.warning("⚠️ موجود بالفعل لليوم")
+                        else:
+                            ti = TaskInstance(task_id=sel, date=today, target_value=target)
+                            session.add(ti)
+                            session.commit()
+                            todays_instances.clear()
+                            st.success("✅ تم الإنشاء")
+                            st.rerun()
+
+                    if st.button("➕ إنشاء نسخ لجميع المهام لليوم"):
+                        today = date.today()
+                        existing = {r.task_id for r in session.query(TaskInstance.task_id).filter_by(date=today)}
+                        new_rows = [
+                            {"task_id": t['id'], "date": today, "target_value": target}
+                            for t in task_options if t['id'] not in existing
+                        ]
+                        if not new_rows:
+                            st.warning("⚠️ جميع المهام لها نسخ لليوم بالفعل")
+                        else:
+                            bulk_insert(TaskInstance, new_rows)
+                            todays_instances.clear()
+                            st.success(f"✅ تم إنشاء {len(new_rows)} نسخة")
+                            st.rerun()
+
+            st.subheader("قائمة المهام")
+            tasks = list_tasks()
+            if not tasks:
+                st.info("لا توجد مهام بعد")
+            else:
+                user_names = {u['id']: u['name'] for u in list_users()}
+                group_names = {g['id']: g['name'] for g in list_groups()}
+                for t in tasks:
+                    assigned_name = user_names.get(t['assigned_to'], "—")
+                    group_name = group_names.get(t['assigned_group_id'], "—")
+                    st.write(
+                        f"- **{t['title']}** | الوحدة: `{t['unit_name'] or '—'}` "
+                        f"| نقاط/وحدة: `{t['points_per_unit']}` "
+                        f"| للجميع: `{'✅' if t['is_global'] else '❌'}` "
+                        f"| مستخدم: `{assigned_name}` | مجموعة: `{group_name}`"
+                    )
+
+        # ===================== المستخدمون (مدير فقط) =====================
+        elif menu == "👥 المستخدمون" and user.role == 'admin':
+            st.header("👥 إدارة المستخدمين والمجموعات")
+
+            col1, col2 = st.columns(2)
+
+            with col1:
+                st.subheader("إنشاء مجموعة")
+                with st.form("create_group"):
+                    gname = st.text_input("اسم المجموعة")
+                    if st.form_submit_button("✅ إنشاء مجموعة", use_container_width=True):
+                        if not gname.strip():
+                            st.error("يرجى إدخال اسم المجموعة")
+                        else:
+                            grp = Group(name=gname.strip())
+                            session.add(grp)
+                            session.commit()
+                            list_groups.clear()
+                            st.success("✅ تم إنشاء المجموعة")
+                            st.rerun()
+
+            with col2:
+                st.subheader("إنشاء مستخدم")
+                with st.form("create_user"):
+                    uname = st.text_input("الاسم")
+                    uemail = st.text_input("البريد")
+                    upass = st.text_input("كلمة المرور", type="password")
+                    urole = st.selectbox("الدور", options=list(ROLE_LABELS), format_func=ROLE_LABELS.get)
+                    groups_list = list_groups()
+                    group_names = {g['id']: g['name'] for g in groups_list}
+                    group_names[None] = "—"
+                    gid = st.selectbox(
+                        "اختر مجموعة (اختياري)",
+                        options=[None] + [g['id'] for g in groups_list],
+                        format_func=group_names.get
+                    )
+                    if st.form_submit_button("✅ إنشاء مستخدم", use_container_width=True):
+                        if not uname.strip() or not uemail.strip() or not upass:
+                            st.error("يرجى ملء جميع الحقول المطلوبة")
+                        else:
+                            if session.query(exists().where(User.email == uemail.strip())).scalar():
+                                st.error("❌ البريد موجود مسبقاً")
+                            else:
+                                # التجزئة تبدأ فقط بعد التأكد من عدم تكرار البريد
+                                password_future = hasher_pool().submit(hash_password, upass)
+                                new_user = User(
+                                    name=uname.strip(),
+                                    email=uemail.strip(),
+                                    password_hash=password_future.result(),
+                                    role=urole,
+                                    group_id=gid
+                                )
+                                session.add(new_user)
+                                session.commit()
+                                list_users.clear()
+                                get_user_by_email.clear()
+                                st.success("✅ تم إنشاء المستخدم")
+                                st.rerun()
+
+            st.divider()
+            st.subheader("قائمة المستخدمين")
+            users_list = list_users()
+            users_data = [{
+                "الاسم": u['name'],
+                "البريد": u['email'],
+                "الدور": ROLE_LABELS.get(u['role'], "مستخدم"),
+                "المجموعة": u['group_name'] or "—"
+            } for u in users_list]
+            st.dataframe(pd.DataFrame(users_data), use_container_width=True)
+finally:
+    session.close()